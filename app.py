@@ -1,45 +1,165 @@
+import os
 import pandas as pd
-from datetime import time
 import streamlit as st
 import numpy as np 
 import pydeck as pdk 
 
+try:
+    import numba  # 선택 의존성: 대용량 연속 결제 탐지 가속
+except ImportError:
+    numba = None
+
+try:
+    import pyarrow as pa  # 선택 의존성: 멀티스레드 CSV 파싱
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
 # --- 1. 데이터 로딩 및 규칙 정의 ---
 
 # Mapbox API 키 설정
-try:
-    # st.secrets에서 mapbox_token을 안전하게 불러옵니다.
-    MAPBOX_API_KEY = st.secrets["mapbox_token"]
-except Exception:
-    MAPBOX_API_KEY = None 
-    # 토큰이 없을 경우 경고를 표시합니다.
-    st.warning("🚨 Mapbox 토큰 설정 오류: 지도가 표시되지 않거나 Mapbox 워터마크가 나타날 수 있습니다. '.streamlit/secrets.toml' 설정을 확인하세요.")
+@st.cache_resource(show_spinner=False)
+def get_mapbox_api_key():
+    """st.secrets에서 mapbox_token을 한 번만 불러옵니다. (없으면 None)"""
+    try:
+        return st.secrets["mapbox_token"]
+    except Exception:
+        return None
 
 
-def load_data(file_path='data/transactions.csv'):
+def get_file_mtime(file_path):
+    """캐시 키로 사용할 파일 수정 시각을 반환합니다. (파일이 없으면 None)"""
+    try:
+        return os.path.getmtime(file_path)
+    except OSError:
+        return None
+
+
+# CSV에서 문자열로 읽어야 하는 컬럼 (숫자처럼 보이는 ID/코드 포함)
+STRING_COLUMNS = ('transaction_id', 'mcc_code', 'card_holder_id', 'merchant_name')
+
+
+def csv_parse_options(file_path, string_dtype):
     """
-    CSV 파일 로드 시, 헤더 표준화, DateTime 파싱, 그리고 Lat/Lon을 float으로 강제 변환합니다.
+    헤더 행만 먼저 읽어 parse_dates/dtype 옵션을 원본 헤더 이름 기준으로 만듭니다.
+    (헤더 표준화는 읽은 뒤에 하므로 'TRANSACTION_DT'처럼 대소문자/공백이 다른 헤더도 대응)
     """
-    try:
-        # 구분자(delimiter=',') 명시 및 인코딩 처리
-        df = pd.read_csv(file_path, encoding='utf-8', skipinitialspace=True, delimiter=',') 
-        
-        # 모든 컬럼 이름 표준화 (소문자, 공백 제거)
-        df.columns = df.columns.str.lower().str.strip()
-        
-        # 'transaction_dt' 컬럼 검증 및 파싱
-        if 'transaction_dt' not in df.columns:
-            st.error(f"디버깅 정보: 로드된 컬럼: {list(df.columns)}") 
-            raise ValueError("CSV 파일에 'transaction_dt' 컬럼이 존재하지 않습니다.")
+    header = pd.read_csv(file_path, nrows=0, encoding='utf-8', skipinitialspace=True).columns
+    raw_names = {col.strip().lower(): col for col in header}
+    return {
+        'parse_dates': [raw_names[col] for col in ('transaction_dt',) if col in raw_names],
+        'dtype': {raw_names[col]: string_dtype for col in STRING_COLUMNS if col in raw_names},
+    }
+
 
+def read_csv_pyarrow(file_path):
+    """
+    pyarrow로 CSV를 읽습니다. 문자열 컬럼은 파싱 단계에서 string 타입으로 고정합니다. (빈 칸이 있어도 '5812.0'처럼 숫자로 추론되지 않음)
+    pyarrow에는 skipinitialspace가 없으므로, 값 앞에 공백이 있는 파일(', ' 구분자)이면 None을 반환합니다.
+    """
+    # 헤더는 공백을 그대로 둔 원본 이름으로 읽어야 pyarrow의 컬럼 이름과 일치
+    header = pd.read_csv(file_path, nrows=0, encoding='utf-8').columns
+    column_types = {col: pa.string() for col in header if col.strip().lower() in STRING_COLUMNS}
+    table = pa_csv.read_csv(
+        file_path,
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    )
+
+    # 앞 공백이 있는 값은 숫자/날짜로도 추론되지 않고 문자열 컬럼에 남으므로 문자열 컬럼만 확인하면 됨
+    for column in table.columns:
+        if pa.types.is_string(column.type) and pc.any(pc.match_substring_regex(column, '^[ \t]')).as_py():
+            return None
+
+    df = table.to_pandas()
+    for col in df.columns:
+        if col in column_types:
+            df[col] = df[col].astype('string[pyarrow]')
+    return df
+
+
+def read_transactions_csv(file_path):
+    """
+    거래 CSV를 읽습니다. transaction_dt는 파서에서 바로 datetime으로 변환하고, 문자열 컬럼은 dtype을 명시합니다.
+    (mcc_code는 숫자로 추론되지 않도록 문자열로 읽은 뒤 load_data에서 category로 변환)
+    """
+    if pa is not None:
+        try:
+            df = read_csv_pyarrow(file_path)
+            if df is not None:
+                return df
+        except (KeyError, ValueError):
+            # 파싱/컬럼 오류(pa.ArrowInvalid 포함)가 나면 아래 C 엔진으로 다시 읽음
+            pass
+
+    # 구분자 뒤 공백이 있는 CSV나 pyarrow가 없는 환경에서는 기본 C 엔진 사용 (구분자/공백 처리 명시)
+    return pd.read_csv(
+        file_path, encoding='utf-8', skipinitialspace=True, delimiter=',',
+        **csv_parse_options(file_path, 'string')
+    )
+
+
+def resolve_data_path(file_path):
+    """같은 이름의 .parquet 파일이 있고 CSV보다 최신이면 그 경로를, 아니면 원래 경로를 반환합니다."""
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    parquet_mtime = get_file_mtime(parquet_path)
+    if parquet_mtime is not None and parquet_mtime >= (get_file_mtime(file_path) or 0):
+        return parquet_path
+    return file_path
+
+
+def prepare_transactions(df):
+    """읽어 온 거래 데이터의 헤더를 표준화하고 컬럼 타입을 정리합니다. (load_data와 청크 단위 탐지에서 공통 사용)"""
+    # 모든 컬럼 이름 표준화 (소문자, 공백 제거)
+    df.columns = [col.strip().lower() for col in df.columns]
+    
+    # 'transaction_dt' 컬럼 검증
+    if 'transaction_dt' not in df.columns:
+        st.error(f"디버깅 정보: 로드된 컬럼: {list(df.columns)}") 
+        raise ValueError("CSV 파일에 'transaction_dt' 컬럼이 존재하지 않습니다.")
+    # 파서가 날짜 형식을 해석하지 못하면 문자열로 남으므로 여기서 변환 (실패 시 호출부에서 st.error 처리)
+    if not pd.api.types.is_datetime64_any_dtype(df['transaction_dt']):
         df['transaction_dt'] = pd.to_datetime(df['transaction_dt'])
+    
+    # 저카디널리티 문자열 컬럼은 category로 통일 (isin/groupby/비교가 정수 코드 연산이 됨)
+    for col in ('mcc_code', 'card_holder_id', 'merchant_name'):
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    # 위치 정보 컬럼을 float으로 강제 변환 (지도 오류 해결 핵심)
+    if 'location_lat' in df.columns and 'location_lon' in df.columns:
+        # 파서가 이미 숫자로 읽은 경우(정상 데이터)에는 변환 패스를 생략
+        for col in ('location_lat', 'location_lon'):
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        # 줌 11 지도 표시에는 float32 정밀도로 충분 (메모리/전송량 절반)
+        df[['location_lat', 'location_lon']] = df[['location_lat', 'location_lon']].astype('float32')
+
+    # 정수 금액은 가능한 가장 작은 정수 타입으로 축소 (결측/소수가 있으면 그대로 유지)
+    if 'amount' in df.columns:
+        df['amount'] = pd.to_numeric(df['amount'], downcast='integer')
+
+    # 경고 -> 거래 조회를 위해 transaction_id를 인덱스로 설정 (컬럼도 유지)
+    if 'transaction_id' in df.columns:
+        df = df.set_index('transaction_id', drop=False)
+
+    return df
+
+
+@st.cache_data(show_spinner=False)
+def load_data(file_path='data/transactions.csv', mtime=None):
+    """
+    CSV(또는 변환된 Parquet) 파일 로드 시, 헤더 표준화, DateTime 파싱, 그리고 Lat/Lon을 float으로 강제 변환합니다.
+    결과는 캐시되며, mtime(파일 수정 시각)은 파일이 바뀌었을 때 다시 읽도록 하는 캐시 키로만 사용됩니다.
+    """
+    try:
+        if file_path.endswith('.parquet'):
+            # Parquet에는 컬럼 타입이 저장되어 있어 텍스트/날짜 파싱이 필요 없음
+            df = pd.read_parquet(file_path, engine='pyarrow')
+        else:
+            df = read_transactions_csv(file_path)
         
-        # 위치 정보 컬럼을 float으로 강제 변환 (지도 오류 해결 핵심)
-        if 'location_lat' in df.columns and 'location_lon' in df.columns:
-            df['location_lat'] = pd.to_numeric(df['location_lat'], errors='coerce')
-            df['location_lon'] = pd.to_numeric(df['location_lon'], errors='coerce')
-        
-        return df
+        return prepare_transactions(df)
     
     except FileNotFoundError:
         st.error(f"🚨 파일을 찾을 수 없습니다: '{file_path}'. 경로를 확인하십시오.")
@@ -50,134 +170,415 @@ def load_data(file_path='data/transactions.csv'):
 
 
 # 규칙에 사용될 상수 정의
-PROHIBITED_MCCS = ['5813', '7995', '5814']
-HOLIDAY_LIST = [pd.to_datetime('2025-12-25').date(), pd.to_datetime('2026-01-01').date()]
+ALERT_COLUMNS = ['transaction_id', 'rule_name', 'severity', 'detail', 'alert_dt']
+# 경고 심각도: 심각한 순서로 정렬되는 category (비교/isin/value_counts가 정수 코드 연산)
+SEVERITY_DTYPE = pd.CategoricalDtype(['Critical', 'High', 'Medium'], ordered=True)
+PROHIBITED_MCCS = frozenset({'5813', '7995', '5814'})
+HOLIDAY_LIST = pd.to_datetime(['2025-12-25', '2026-01-01'])  # DatetimeIndex: 해시 기반 isin
 
 # --- 2. 탐지 함수 정의 (변경 없음) ---
 
-def check_restricted_mcc(df):
+def isin_by_codes(s, values):
+    """category 컬럼이면 카테고리 코드 집합으로 멤버십을 판정 (object 비교 회피)"""
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        return s.isin(values)
+    target_codes = np.flatnonzero(s.cat.categories.isin(values))
+    return pd.Series(np.isin(s.cat.codes.to_numpy(), target_codes), index=s.index)
+
+
+def same_as_prev(s):
+    """각 행이 직전 행과 같은 값인지 bool 배열로 반환 (첫 행과 결측은 False)"""
+    same = np.zeros(len(s), dtype=bool)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # 문자열 비교 대신 카테고리 정수 코드를 비교 (-1은 결측)
+        codes = s.cat.codes.to_numpy()
+        same[1:] = (codes[1:] == codes[:-1]) & (codes[1:] != -1)
+    else:
+        values = s.to_numpy()
+        same[1:] = pd.notna(values[1:]) & (values[1:] == values[:-1])
+    return same
+
+
+def check_restricted_mcc(df, now):
     """제한 업종 MCC 코드 탐지 (Critical)"""
-    alerts = []
-    restricted_tx = df[df['mcc_code'].isin(PROHIBITED_MCCS)]
-    
-    for _, tx in restricted_tx.iterrows():
-        alerts.append({
-            'transaction_id': tx['transaction_id'],
-            'rule_name': '제한 업종 사용',
-            'severity': 'Critical',
-            'detail': f"금지된 MCC 코드({tx['mcc_code']}) 사용",
-            'alert_dt': pd.Timestamp.now()
-        })
+    restricted_tx = df.loc[isin_by_codes(df['mcc_code'], PROHIBITED_MCCS), ['transaction_id', 'mcc_code']]
+
+    # iterrows 대신 컬럼 단위 연산으로 경고 레코드를 한 번에 생성
+    detail = "금지된 MCC 코드(" + restricted_tx['mcc_code'].astype(str) + ") 사용"
+    alerts = pd.DataFrame({
+        'transaction_id': restricted_tx['transaction_id'].values,
+        'rule_name': '제한 업종 사용',
+        'severity': 'Critical',
+        'detail': detail.values,
+        'alert_dt': now
+    })
     return alerts
 
-def check_irregular_time(df):
+def check_irregular_time(df, now):
     """비정상 시간/휴일 사용 탐지 (High)"""
-    alerts = []
-    
-    for _, tx in df.iterrows():
-        tx_time = tx['transaction_dt'].time()
-        tx_date = tx['transaction_dt'].date()
-        day_of_week = tx['transaction_dt'].weekday()  
-        
-        # 1. 심야 시간 (23:00 ~ 05:59)
-        if tx_time >= time(23, 0) or tx_time < time(6, 0):
-            alerts.append({
-                'transaction_id': tx['transaction_id'],
-                'rule_name': '심야 시간 사용',
-                'severity': 'High',
-                'detail': f"사용 시간: {tx_time}",
-                'alert_dt': pd.Timestamp.now()
-            })
-            
-        # 2. 휴일 사용
-        if day_of_week >= 5 or tx_date in HOLIDAY_LIST:
-            alerts.append({
-                'transaction_id': tx['transaction_id'],
-                'rule_name': '휴일 사용',
-                'severity': 'High',
-                'detail': f"사용 일자: {tx_date}",
-                'alert_dt': pd.Timestamp.now()
-            })
-            
+    tx_dt = df['transaction_dt']
+
+    # 행 단위 .time()/.date()/.weekday() 호출 대신 .dt 접근자로 마스크를 한 번에 계산
+    hours = tx_dt.dt.hour
+    dow = tx_dt.dt.dayofweek
+    dates = tx_dt.dt.normalize()
+
+    # 1. 심야 시간 (23:00 ~ 05:59)
+    night_mask = (hours >= 23) | (hours < 6)
+    night_alerts = pd.DataFrame({
+        'transaction_id': df.loc[night_mask, 'transaction_id'].values,
+        'rule_name': '심야 시간 사용',
+        'severity': 'High',
+        'detail': ("사용 시간: " + tx_dt[night_mask].dt.strftime('%H:%M:%S')).values,
+        'alert_dt': now
+    })
+
+    # 2. 휴일 사용
+    holiday_mask = (dow >= 5) | dates.isin(HOLIDAY_LIST)
+    holiday_alerts = pd.DataFrame({
+        'transaction_id': df.loc[holiday_mask, 'transaction_id'].values,
+        'rule_name': '휴일 사용',
+        'severity': 'High',
+        'detail': ("사용 일자: " + tx_dt[holiday_mask].dt.strftime('%Y-%m-%d')).values,
+        'alert_dt': now
+    })
+
+    alerts = pd.concat([night_alerts, holiday_alerts], ignore_index=True)
     return alerts
 
-def check_sequential_transactions(df):
-    """연속/중복 결제 패턴 탐지 (Medium/High)"""
-    alerts = []
-    
-    df_sorted = df.sort_values(by=['card_holder_id', 'transaction_dt']).copy()
-    
-    df_sorted['time_diff'] = df_sorted.groupby('card_holder_id')['transaction_dt'].diff().dt.total_seconds() / 60
-    
-    df_sorted['prev_merchant'] = df_sorted.groupby('card_holder_id')['merchant_name'].shift(1)
-    df_sorted['prev_mcc'] = df_sorted.groupby('card_holder_id')['mcc_code'].shift(1)
+def category_code(s, value):
+    """category 컬럼에서 value의 정수 코드를 반환 (카테고리에 없으면 -1)"""
+    categories = s.cat.categories
+    return categories.get_loc(value) if value in categories else -1
+
+
+if numba is not None:
+    NAT_I8 = np.iinfo(np.int64).min
+
+    @numba.njit(cache=True)
+    def scan_sequential(holder_codes, ts_ns, mcc_codes, merchant_codes,
+                        mcc_from, mcc_to_a, mcc_to_b, out_seq, out_trans):
+        """(사용자, 거래시각) 정렬된 정수 배열을 한 번 훑어 두 규칙의 마스크를 채움"""
+        for i in range(1, len(holder_codes)):
+            if holder_codes[i] == -1 or holder_codes[i] != holder_codes[i - 1]:
+                continue
+            if ts_ns[i] == NAT_I8 or ts_ns[i - 1] == NAT_I8:
+                continue
+            diff_ns = ts_ns[i] - ts_ns[i - 1]
+
+            # 1. 동일 가맹점 연속 결제 (10분 이내)
+            out_seq[i] = (diff_ns <= 600_000_000_000
+                          and merchant_codes[i] != -1
+                          and merchant_codes[i] == merchant_codes[i - 1])
+
+            # 2. 고위험 업종 이동 (30분 이내, 5812 -> 5813/5814)
+            out_trans[i] = (diff_ns <= 1_800_000_000_000
+                            and mcc_from != -1
+                            and mcc_codes[i - 1] == mcc_from
+                            and mcc_codes[i] != -1
+                            and (mcc_codes[i] == mcc_to_a or mcc_codes[i] == mcc_to_b))
+
+
+def sequential_masks_numba(df_sorted):
+    """Numba 커널로 연속 결제/업종 이동 마스크를 계산 (category 컬럼 전제)"""
+    n = len(df_sorted)
+    out_seq = np.zeros(n, dtype=np.bool_)
+    out_trans = np.zeros(n, dtype=np.bool_)
+    mcc = df_sorted['mcc_code']
+    scan_sequential(
+        df_sorted['card_holder_id'].cat.codes.to_numpy(),
+        df_sorted['transaction_dt'].to_numpy(dtype='datetime64[ns]').view('int64'),
+        mcc.cat.codes.to_numpy(),
+        df_sorted['merchant_name'].cat.codes.to_numpy(),
+        category_code(mcc, '5812'), category_code(mcc, '5813'), category_code(mcc, '5814'),
+        out_seq, out_trans
+    )
+    return out_seq, out_trans
+
+
+def sequential_masks_pandas(df_sorted):
+    """pandas shift 연산으로 연속 결제/업종 이동 마스크를 계산"""
+    # 정렬 후에는 '직전 행이 같은 사용자'인지만 보면 되므로 groupby 없이 전체 shift 후
+    # 사용자 경계(각 그룹의 첫 행)만 무효화
+    same_holder = same_as_prev(df_sorted['card_holder_id'])
+
+    prev_dt = df_sorted['transaction_dt'].shift(1)
+    time_diff = ((df_sorted['transaction_dt'] - prev_dt).dt.total_seconds() / 60).where(same_holder)
 
     # 1. 동일 가맹점 연속 결제 (10분 이내)
-    sequential_mask = (df_sorted['time_diff'] <= 10) & \
-                      (df_sorted['merchant_name'] == df_sorted['prev_merchant'])
-
-    for _, tx in df_sorted[sequential_mask].iterrows():
-        alerts.append({
-            'transaction_id': tx['transaction_id'],
-            'rule_name': '동일 가맹점 연속 결제',
-            'severity': 'Medium',
-            'detail': f"이전 거래와의 시간차: {tx['time_diff']:.1f}분",
-            'alert_dt': pd.Timestamp.now()
-        })
+    sequential_mask = (time_diff <= 10) & \
+                      same_as_prev(df_sorted['merchant_name'])
 
     # 2. 고위험 업종 이동 (30분 이내, 식당(5812) -> 주점(5813))
-    transition_mask = (df_sorted['time_diff'] <= 30) & \
-                      (df_sorted['prev_mcc'] == '5812') & \
-                      (df_sorted['mcc_code'].isin(['5813', '5814'])) 
-
-    for _, tx in df_sorted[transition_mask].iterrows():
-        alerts.append({
-            'transaction_id': tx['transaction_id'],
-            'rule_name': '고위험 업종 이동 결제',
-            'severity': 'High',
-            'detail': f"이전 업종({tx['prev_mcc']})에서 현재 업종({tx['mcc_code']})으로 전환",
-            'alert_dt': pd.Timestamp.now()
-        })
+    # 전체 행에 prev_mcc를 shift하지 않고, 현재 업종이 5813/5814인 후보 행만 골라 직전 행을 확인.
+    # '직전 거래' 기준이므로 후보 부분집합을 따로 정렬하지 않고 전체 정렬 순서를 그대로 사용
+    # (부분집합만 정렬하면 사이에 낀 다른 업종 거래를 건너뛰어 결과가 달라짐)
+    mcc = df_sorted['mcc_code']
+    candidates = np.flatnonzero(isin_by_codes(mcc, ['5813', '5814']).to_numpy() & same_holder)
+    transition_mask = np.zeros(len(df_sorted), dtype=bool)
+    transition_mask[candidates] = (
+        isin_by_codes(mcc.iloc[candidates - 1], ['5812']).to_numpy() &
+        (time_diff.to_numpy()[candidates] <= 30)
+    )
+
+    return sequential_mask.to_numpy(), transition_mask
+
+
+def check_sequential_transactions(df, now):
+    """
+    연속/중복 결제 패턴 탐지 (Medium/High)
+    두 규칙은 서로 독립적인 경고 집합을 만듭니다. (한 거래가 두 규칙에 모두 걸리면 rule_name이 다른 두 경고)
+    """
+    df_sorted = df.sort_values(by=['card_holder_id', 'transaction_dt'])
+
+    # numba가 설치되어 있고 주요 컬럼이 category이면 단일 패스 커널 사용
+    use_numba = numba is not None and all(
+        isinstance(df_sorted[col].dtype, pd.CategoricalDtype)
+        for col in ('card_holder_id', 'mcc_code', 'merchant_name')
+    )
+    if use_numba:
+        sequential_mask, transition_mask = sequential_masks_numba(df_sorted)
+    else:
+        sequential_mask, transition_mask = sequential_masks_pandas(df_sorted)
+
+    tx_ids = df_sorted['transaction_id']
+    tx_dt = df_sorted['transaction_dt']
+
+    # 1. 동일 가맹점 연속 결제: 매칭된 행(pos)과 직전 행(pos - 1)의 시간차만 계산
+    seq_pos = np.flatnonzero(sequential_mask)
+    seq_diff = pd.Series(
+        (tx_dt.iloc[seq_pos].to_numpy() - tx_dt.iloc[seq_pos - 1].to_numpy()) / np.timedelta64(1, 'm')
+    )
+    seq_alerts = pd.DataFrame({
+        'transaction_id': tx_ids.iloc[seq_pos].values,
+        'rule_name': '동일 가맹점 연속 결제',
+        'severity': 'Medium',
+        'detail': ("이전 거래와의 시간차: " + seq_diff.map('{:.1f}'.format).astype(str) + "분").values,
+        'alert_dt': now
+    })
+
+    # 2. 고위험 업종 이동
+    trans_pos = np.flatnonzero(transition_mask)
+    mcc_str = df_sorted['mcc_code'].astype(str)
+    trans_alerts = pd.DataFrame({
+        'transaction_id': tx_ids.iloc[trans_pos].values,
+        'rule_name': '고위험 업종 이동 결제',
+        'severity': 'High',
+        'detail': ("이전 업종(" + mcc_str.iloc[trans_pos - 1].values + ")에서 현재 업종("
+                   + mcc_str.iloc[trans_pos].values + ")으로 전환"),
+        'alert_dt': now
+    })
+
+    alerts = pd.concat([seq_alerts, trans_alerts], ignore_index=True)
     return alerts
 
 
-def run_all_detection(df):
-    """모든 탐지 함수를 실행하고 결과를 통합"""
+@st.cache_data(show_spinner=False)
+def run_all_detection(_df, data_key):
+    """
+    모든 탐지 함수를 실행하고 결과를 통합
+    캐시 키는 data_key(파일 경로, 수정 시각)만 사용합니다. (DataFrame 해시는 대용량에서 표본만 보므로 _df는 해시하지 않음)
+    """
+    df = _df
     if df.empty:
-        return []
+        return pd.DataFrame(columns=ALERT_COLUMNS)
         
-    all_alerts = []
-    
-    all_alerts.extend(check_restricted_mcc(df))
-    all_alerts.extend(check_irregular_time(df))
-    all_alerts.extend(check_sequential_transactions(df))
-    
-    return all_alerts
+    # 경고 생성 시각은 탐지 1회당 한 번만 계산해 모든 경고에 공유
+    now = pd.Timestamp.now()
+
+    # 탐지 함수별 DataFrame을 한 번에 이어 붙임 (list[dict] 왕복 생략)
+    # 각 규칙은 거래당 최대 1건의 경고만 만들므로 (transaction_id, rule_name) 중복 제거가 필요 없음
+    alerts = pd.concat([
+        check_restricted_mcc(df, now),
+        check_irregular_time(df, now),
+        check_sequential_transactions(df, now)
+    ], ignore_index=True)
+    alerts['severity'] = alerts['severity'].astype(SEVERITY_DTYPE)
+    return alerts
+
+
+# 이 크기를 넘는 CSV는 한 번에 읽지 않고 청크 단위로 읽으며 탐지
+STREAMING_THRESHOLD_BYTES = 200 * 2**20
+STREAMING_CHUNK_ROWS = 200_000
+
+
+# 연속 결제 규칙에 필요한 컬럼 (정렬되지 않은 대용량 파일을 다시 검사할 때 이 컬럼만 메모리에 유지)
+SEQUENTIAL_COLUMNS = ['transaction_id', 'card_holder_id', 'transaction_dt', 'mcc_code', 'merchant_name']
+
+
+def read_transaction_chunks(file_path, chunksize):
+    """CSV를 청크 단위로 읽어 표준화된 DataFrame을 차례로 반환합니다. (pyarrow 엔진은 chunksize를 지원하지 않으므로 C 엔진 사용)"""
+    with pd.read_csv(
+        file_path, encoding='utf-8', skipinitialspace=True, delimiter=',',
+        chunksize=chunksize, **csv_parse_options(file_path, 'string')
+    ) as reader:
+        for chunk in reader:
+            yield prepare_transactions(chunk)
+
+
+def follows_carry(chunk, carry):
+    """청크의 카드 소유자별 첫 거래가 이전 청크에서 넘겨받은 마지막 거래보다 이르지 않은지 확인합니다."""
+    first_dt = chunk.groupby(chunk['card_holder_id'].astype(str))['transaction_dt'].min()
+    last_dt = pd.Series(carry['transaction_dt'].to_numpy(), index=carry['card_holder_id'].astype(str).to_numpy())
+    return not (first_dt < last_dt.reindex(first_dt.index)).any()
+
+
+@st.cache_data(show_spinner=False)
+def load_and_detect_streaming(file_path, mtime=None, chunksize=STREAMING_CHUNK_ROWS):
+    """
+    대용량 CSV를 청크 단위로 읽으면서 탐지를 실행합니다. (경고가 발생한 거래만 메모리에 유지)
+    금지 업종/비정상 시간 규칙은 청크별로 바로 실행하고, 연속 결제 규칙은 이전 청크에서 카드 소유자별
+    마지막 거래만 넘겨받아 청크 경계를 넘는 연속 결제도 탐지합니다.
+    어떤 청크에 넘겨받은 거래보다 이른 거래가 있으면(시간순이 아닌 파일) 연속 결제 규칙만
+    필요한 컬럼으로 전체 파일을 다시 읽어 검사합니다.
+    반환값: (경고 대상 거래, 경고, 전체 거래 건수)
+    """
+    empty = (pd.DataFrame(), pd.DataFrame(columns=ALERT_COLUMNS), 0)
+    try:
+        now = pd.Timestamp.now()
+        alert_parts, seq_parts, tx_parts = [], [], []
+        total_count = 0
+        carry = None  # 카드 소유자별 직전 거래 (청크 경계 연결용)
+        in_order = True
+
+        for chunk in read_transaction_chunks(file_path, chunksize):
+            total_count += len(chunk)
+            chunk_alerts = [check_restricted_mcc(chunk, now), check_irregular_time(chunk, now)]
+
+            # 연속 결제: 직전 청크의 꼬리를 앞에 붙여 검사하고, 꼬리 거래 자체의 경고는 이미 보고했으므로 제외
+            if in_order and carry is not None and not follows_carry(chunk, carry):
+                in_order = False  # 청크 경계 검사를 중단하고 아래에서 전체 파일 기준으로 다시 검사
+            if in_order:
+                seq_input = chunk if carry is None else prepare_transactions(pd.concat([carry, chunk]))
+                seq_alerts = check_sequential_transactions(seq_input, now)
+                if carry is not None:
+                    seq_alerts = seq_alerts[~seq_alerts['transaction_id'].isin(carry['transaction_id'])]
+                seq_parts.append(seq_alerts)
+                chunk_alerts.append(seq_alerts)
+                # 날짜가 없는 거래(NaT)는 정렬 시 맨 뒤로 가므로 제외해야 실제 마지막 거래가 넘어감
+                carry = (
+                    seq_input[seq_input['transaction_dt'].notna()]
+                    .sort_values('transaction_dt', kind='stable')
+                    .drop_duplicates('card_holder_id', keep='last')
+                )
+
+            alert_parts += chunk_alerts[:2]
+            chunk_ids = pd.concat([alerts['transaction_id'] for alerts in chunk_alerts])
+            tx_parts.append(chunk[chunk['transaction_id'].isin(chunk_ids)])
+
+        if not in_order:
+            st.warning("⚠️ 파일이 시간순으로 정렬되어 있지 않아 연속 결제 규칙을 전체 파일 기준으로 다시 검사했습니다.")
+            seq_input = prepare_transactions(pd.concat(
+                [chunk[SEQUENTIAL_COLUMNS] for chunk in read_transaction_chunks(file_path, chunksize)]
+            ))
+            seq_parts = [check_sequential_transactions(seq_input, now)]
+            del seq_input
+
+            # 새로 경고가 발생한 거래의 전체 컬럼을 한 번 더 읽어 보충
+            kept_ids = pd.concat([tx['transaction_id'] for tx in tx_parts])
+            missing_ids = seq_parts[0]['transaction_id']
+            missing_ids = missing_ids[~missing_ids.isin(kept_ids)]
+            if not missing_ids.empty:
+                for chunk in read_transaction_chunks(file_path, chunksize):
+                    tx_parts.append(chunk[chunk['transaction_id'].isin(missing_ids)])
+
+        alerts = pd.concat(alert_parts + seq_parts, ignore_index=True)
+        if alerts.empty:
+            return empty[0], empty[1], total_count
+
+        alerts['severity'] = alerts['severity'].astype(SEVERITY_DTYPE)
+        transactions = pd.concat(tx_parts)
+        transactions = transactions[transactions['transaction_id'].isin(alerts['transaction_id'])]
+        return prepare_transactions(transactions), alerts, total_count
+
+    except FileNotFoundError:
+        st.error(f"🚨 파일을 찾을 수 없습니다: '{file_path}'. 경로를 확인하십시오.")
+        return empty
+    except Exception as e:
+        st.error(f"데이터 로딩 중 치명적인 오류 발생: {e}")
+        return empty
 
 # --- 3. Streamlit 애플리케이션 메인 로직 (지도 및 툴팁 포함) ---
 
-def color_severity(val):
-    """심각도에 따라 셀 배경색을 지정하는 함수 (테이블 스타일링용)"""
-    if val == 'Critical':
-        color = '#ffcccc'
-    elif val == 'High':
-        color = '#ffe0b3'
-    elif val == 'Medium':
-        color = '#ffffb3'
-    else:
-        color = ''
-    return f'background-color: {color}'
+def color_severity(s):
+    """심각도에 따라 셀 배경색을 지정하는 함수 (테이블 스타일링용, 컬럼 단위로 한 번에 계산)"""
+    return np.select(
+        [s == 'Critical', s == 'High', s == 'Medium'],
+        ['background-color: #ffcccc', 'background-color: #ffe0b3', 'background-color: #ffffb3'],
+        default=''
+    )
+
+
+# 심각도에 따른 Pydeck 포인트 색상 (RGBA 리스트)
+SEVERITY_COLORS = {
+    'Critical': [255, 0, 0, 200],    # Critical: Red (빨강)
+    'High': [255, 165, 0, 200],      # High: Orange (주황)
+    'Medium': [255, 255, 0, 200],    # Medium: Yellow (노랑)
+}
+DEFAULT_SEVERITY_COLOR = [100, 100, 100, 150] # Default
+
+
+@st.cache_data(show_spinner=False)
+def build_map_data(_alerts_df, _transactions_df, data_key):
+    """
+    경고에 거래 정보(사용자/사용처/금액/위치)를 붙여 지도/테이블용 데이터를 만듭니다.
+    위치 정보가 없는 경고는 제외되며, 결과는 data_key(파일 경로, 수정 시각) 기준으로 캐시되어 필터 변경 시 재계산하지 않습니다.
+    """
+    alerts_df, transactions_df = _alerts_df, _transactions_df
+    # 위치 정보가 있는 거래만 먼저 골라 작은 조회 테이블을 만든 뒤 (pydeck을 위해 'lat'/'lon'으로 이름 변경)
+    geo_tx = transactions_df.loc[
+        transactions_df['location_lat'].notna() & transactions_df['location_lon'].notna(),
+        ['card_holder_id', 'amount', 'merchant_name', 'location_lat', 'location_lon']
+    ].rename(columns={'location_lat': 'lat', 'location_lon': 'lon'})
+
+    # transaction_id 인덱스 기준 inner join: 위치 정보가 없는 경고는 자동으로 제외
+    map_data = alerts_df.join(geo_tx, on='transaction_id', how='inner').reset_index(drop=True)
+
+    # 툴팁 HTML은 pydeck 템플릿({컬럼})으로 브라우저에서 채우므로, 행별 HTML 대신 금액 문자열만 준비 (금액이 없으면 NA 유지)
+    map_data['amount_label'] = map_data['amount'].map('{:,.0f}원'.format, na_action='ignore')
+    return map_data
+
 
+def alert_lines(map_data):
+    """툴팁 표시용: 경고마다 사용자/사용처/금액/위반 사유/심각도를 한 줄로 만듭니다. (값이 없으면 '-')"""
+    def text(col):
+        return map_data[col].astype('string').fillna('-')
 
-def get_color_by_severity(row):
-    """심각도에 따라 Pydeck 포인트 색상 (RGBA 리스트)을 반환합니다."""
-    if row['severity'] == 'Critical':
-        return [255, 0, 0, 200]    # Critical: Red (빨강)
-    elif row['severity'] == 'High':
-        return [255, 165, 0, 200]  # High: Orange (주황)
-    elif row['severity'] == 'Medium':
-        return [255, 255, 0, 200]  # Medium: Yellow (노랑)
-    return [100, 100, 100, 150] # Default
+    return (
+        text('card_holder_id') + ' · ' + text('merchant_name') + ' · ' + text('amount_label')
+        + ' · ' + text('rule_name') + ' (' + text('severity') + ')'
+    )
+
+
+def aggregate_map_pins(map_data):
+    """
+    반올림한 (lat, lon) 기준으로 경고를 집계해 위치당 핀 하나를 만듭니다.
+    심각도는 가장 높은 값, 툴팁에는 경고별 한 줄(사용자/사용처/금액/위반 사유)을 심각한 순서로 연결합니다.
+    """
+    # severity는 심각한 순서로 정렬되는 category이므로 정렬 후 그룹별 첫 값이 최고 심각도
+    ranked = map_data.assign(
+        lat=map_data['lat'].round(5),
+        lon=map_data['lon'].round(5),
+        alert_line=alert_lines(map_data)
+    ).sort_values('severity', kind='stable')
+
+    return ranked.groupby(['lat', 'lon'], sort=False).agg(
+        alert_count=('transaction_id', 'size'),
+        severity=('severity', 'first'),
+        alert_lines=('alert_line', '<br>'.join)
+    ).reset_index()
+
+
+@st.cache_data(show_spinner=False)
+def build_pin_data(_map_view, data_key, severities):
+    """
+    지도에 보낼 핀 데이터(위치별 집계 + 심각도 색상)를 만듭니다.
+    필터된 DataFrame 대신 data_key와 선택한 심각도(tuple)로 캐시하므로 _map_view는 해시하지 않습니다.
+    """
+    pin_data = aggregate_map_pins(_map_view)
+    # 행 단위 apply 대신 dict 조회로 색상 매핑
+    pin_data['color'] = [SEVERITY_COLORS.get(s, DEFAULT_SEVERITY_COLOR) for s in pin_data['severity'].to_numpy()]
+    return pin_data
 
 
 # ==============================================================================
@@ -186,71 +587,71 @@ if __name__ == '__main__':
     st.set_page_config(layout="wide")
     st.title("🛡️ CardGuard AI: 법인카드 이상 활동 경고 (SAA) 시스템")
 
-    # 1. 데이터 로드 
-    transactions_df = load_data('data/transactions.csv') 
+    mapbox_api_key = get_mapbox_api_key()
+    if mapbox_api_key is None:
+        # 토큰이 없을 경우 경고를 표시합니다.
+        st.warning("🚨 Mapbox 토큰 설정 오류: 지도가 표시되지 않거나 Mapbox 워터마크가 나타날 수 있습니다. '.streamlit/secrets.toml' 설정을 확인하세요.")
+
+    # 1. 데이터 로드 (파일 수정 시각 기준으로 캐시, 최신 Parquet 변환본이 있으면 우선 사용)
+    data_path = resolve_data_path('data/transactions.csv')
+    data_mtime = get_file_mtime(data_path)
+    data_key = (data_path, data_mtime)  # 로드/탐지/지도 캐시에 공통으로 쓰는 데이터 식별자
+    # 대용량 CSV는 청크 단위로 읽으면서 탐지 (경고가 발생한 거래만 메모리에 유지)
+    streaming = (
+        data_path.endswith('.csv') and data_mtime is not None
+        and os.path.getsize(data_path) > STREAMING_THRESHOLD_BYTES
+    )
+    if streaming:
+        transactions_df, alerts_df, total_tx_count = load_and_detect_streaming(data_path, data_mtime)
+    else:
+        transactions_df = load_data(data_path, data_mtime)
+        total_tx_count = len(transactions_df)
 
-    if transactions_df.empty:
+    if total_tx_count == 0:
         st.info("👈 데이터 로드에 실패했거나, 'data/transactions.csv' 파일이 비어 있습니다.")
     else:
-        # 2. 탐지 실행
-        alerts_result = run_all_detection(transactions_df)
+        # 2. 탐지 실행 (청크 단위 로드 시에는 로드와 함께 이미 실행됨)
+        if not streaming:
+            alerts_df = run_all_detection(transactions_df, data_key)
 
         st.header("📈 1. 전체 거래 현황")
-        st.dataframe(transactions_df, use_container_width=True)
+        if streaming:
+            st.caption(f"대용량 파일(총 {total_tx_count:,}건)이므로 경고가 발생한 거래만 표시합니다.")
+        st.dataframe(transactions_df, use_container_width=True, hide_index=True)
         
         st.header("🔔 2. 탐지 경고 결과 (SAA)")
 
         # 3. 경고 출력, 지도 표시 및 지표 표시
-        if alerts_result:
-            alerts_df = pd.DataFrame(alerts_result)
-            alerts_df = alerts_df.drop_duplicates(subset=['transaction_id', 'rule_name']) 
-            
-            # --- 지도 생성을 위해 원본 거래 데이터와 경고 데이터를 병합 ---
-            map_data = alerts_df.merge(
-                transactions_df[['transaction_id', 'card_holder_id', 'amount', 'merchant_name', 'location_lat', 'location_lon']],
-                on='transaction_id',
-                how='left'
-            )
-            
-            # pydeck을 위해 컬럼 이름을 'lat'과 'lon'으로 변경
-            map_data = map_data.rename(columns={
-                'location_lat': 'lat', 
-                'location_lon': 'lon'
-            })
-            
-            # 위치 정보가 없는 경고는 지도에서 제외
-            map_data = map_data.dropna(subset=['lat', 'lon'])
-            
-            # --- 색상 컬럼 추가: 심각도에 따라 색상 매핑 ---
-            map_data['color'] = map_data.apply(get_color_by_severity, axis=1)
-
-            # --- 툴팁에 사용될 상세 정보 컬럼 생성 ---
-            map_data['popup_text'] = (
-                "**사용자:** " + map_data['card_holder_id'].astype(str) + 
-                "<br>**사용처:** " + map_data['merchant_name'].astype(str) +
-                "<br>**금액:** " + map_data['amount'].apply(lambda x: f"{x:,.0f}원") +
-                "<br>**위반 사유:** " + map_data['rule_name'].astype(str) +
-                "<br>**심각도:** " + map_data['severity'].astype(str)
-            )
+        if not alerts_df.empty:
+            # --- 지도 생성을 위해 원본 거래 데이터와 경고 데이터를 병합 (캐시) ---
+            map_data = build_map_data(alerts_df, transactions_df, data_key)
 
             # --- 지표 표시 ---
+            # 심각도별 건수는 value_counts 한 번으로 집계
+            sev_counts = alerts_df['severity'].value_counts()
             col1, col2, col3, col4 = st.columns(4)
-            col1.metric("총 거래 건수", len(transactions_df))
+            col1.metric("총 거래 건수", total_tx_count)
             col2.metric("총 경고 건수", len(alerts_df))
-            col3.metric("Critical 경고", len(alerts_df[alerts_df['severity'] == 'Critical']))
-            col4.metric("High 경고", len(alerts_df[alerts_df['severity'] == 'High']))
+            col3.metric("Critical 경고", int(sev_counts.get('Critical', 0)))
+            col4.metric("High 경고", int(sev_counts.get('High', 0)))
             
             # --- 지도 표시 (pydeck을 사용) ---
             st.header("🗺️ 3. 위반된 사용처 지도 (경고 정보 표시)")
             
-            st.info(f"**총 경고 건수({len(alerts_df)}건)**와 지도에 표시된 핀의 개수가 다를 수 있습니다. 이는 여러 개의 경고가 **동일한 위치**에서 발생했기 때문입니다. 핀 위에 커서를 올려 상세 정보를 확인하세요. (빨강: Critical, 주황: High, 노랑: Medium)")
+            st.info(f"**총 경고 건수({len(alerts_df)}건)**와 지도에 표시된 핀의 개수가 다를 수 있습니다. **동일한 위치**에서 발생한 경고는 하나의 핀으로 합쳐지며, 경고가 많을수록 핀이 커집니다. 핀 위에 커서를 올려 상세 정보를 확인하세요. (핀 색상은 해당 위치의 가장 높은 심각도 기준 - 빨강: Critical, 주황: High, 노랑: Medium)")
+
+            # --- 심각도 필터: 선택한 심각도의 경고만 지도로 전송 ---
+            severity_filter = st.multiselect('심각도 필터', list(SEVERITY_DTYPE.categories), default=['Critical', 'High'])
+            map_view = map_data[map_data['severity'].isin(severity_filter)]
 
+            if not map_view.empty:
+                # --- 동일 위치 경고를 핀 하나로 집계하고 색상 지정 (캐시) ---
+                pin_data = build_pin_data(map_view, data_key, tuple(severity_filter))
 
-            if not map_data.empty:
                 # 1. 뷰포트 설정: 수직 뷰(Top-down View)로 변경 (pitch=0, bearing=0)
                 view_state = pdk.ViewState(
-                    latitude=map_data["lat"].mean(),
-                    longitude=map_data["lon"].mean(),
+                    latitude=map_view["lat"].mean(),
+                    longitude=map_view["lon"].mean(),
                     zoom=11, 
                     pitch=0,   # 수직 뷰
                     bearing=0  # 회전 없음
@@ -259,10 +660,10 @@ if __name__ == '__main__':
                 # 2. 산점도 레이어 설정: get_color를 'color' 컬럼으로 지정
                 layer = pdk.Layer(
                     "ScatterplotLayer",
-                    map_data,
+                    pin_data,
                     get_position=["lon", "lat"], 
                     get_color='color', # 심각도에 따라 동적으로 색상 지정
-                    get_radius=500, 
+                    get_radius="400 + 100 * alert_count", # 경고 1건이면 500, 겹칠수록 커짐
                     pickable=True, 
                 )
                 
@@ -272,7 +673,12 @@ if __name__ == '__main__':
                     initial_view_state=view_state,
                     layers=[layer],
                     tooltip={
-                        "html": "{popup_text}", 
+                        "html": (
+                            "<b>경고 건수:</b> {alert_count}"
+                            "<br><b>최고 심각도:</b> {severity}"
+                            "<br><b>사용자 · 사용처 · 금액 · 위반 사유 (심각도)</b>"
+                            "<br>{alert_lines}"
+                        ),
                         "style": {
                             "backgroundColor": "rgba(30, 30, 30, 0.9)", # 어두운 반투명 배경
                             "color": "#F0F0F0",                        # 밝은 회색 텍스트
@@ -285,21 +691,21 @@ if __name__ == '__main__':
                 )
 
                 # 🚨 Mapbox API 키가 None이 아닐 경우에만 key 속성에 할당 (안정화 로직)
-                if MAPBOX_API_KEY is not None:
-                    deck.mapbox_key = MAPBOX_API_KEY
+                if mapbox_api_key is not None:
+                    deck.mapbox_key = mapbox_api_key
                 
                 # 4. PyDeck 맵 렌더링
                 st.pydeck_chart(deck)
                 
             else:
-                st.info("지도에 표시할 위치 정보(lat, lon)가 있는 경고는 없습니다.")
+                st.info("선택한 심각도 중 지도에 표시할 위치 정보(lat, lon)가 있는 경고는 없습니다.")
 
             # --- 상세 내역 테이블 표시 ---
             st.subheader("⚠️ 경고 상세 내역 (사용자/사용처/금액 포함)")
             
             display_cols = ['alert_dt', 'severity', 'rule_name', 'card_holder_id', 'merchant_name', 'amount', 'detail']
             
-            styled_df = map_data[display_cols].style.applymap(color_severity, subset=['severity']).format({'amount': '{:,.0f}원'})
+            styled_df = map_data[display_cols].style.apply(color_severity, subset=['severity']).format({'amount': '{:,.0f}원'})
 
             st.dataframe(styled_df, use_container_width=True)
 
@@ -0,0 +1,25 @@
+"""
+거래 CSV를 같은 이름의 Parquet(Snappy 압축) 파일로 한 번 변환합니다.
+app.py는 CSV보다 최신인 Parquet 파일이 있으면 CSV 대신 그 파일을 읽습니다.
+
+사용법: python convert_to_parquet.py [CSV 경로] (기본값: data/transactions.csv)
+"""
+import os
+import sys
+
+from app import prepare_transactions, read_transactions_csv
+
+
+if __name__ == '__main__':
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'data/transactions.csv'
+    parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+
+    # app.py와 동일한 타입 변환(datetime/category/float32 등)을 거친 결과를 저장
+    # (캐시/st.error를 거치는 load_data 대신 직접 호출해 읽기 오류가 그대로 보이도록 함)
+    df = prepare_transactions(read_transactions_csv(csv_path))
+    if df.empty:
+        sys.exit(f"변환할 데이터가 없습니다: '{csv_path}'")
+
+    # transaction_id는 컬럼으로도 남아 있으므로 인덱스는 저장하지 않음 (로드 시 다시 설정)
+    df.reset_index(drop=True).to_parquet(parquet_path, engine='pyarrow', compression='snappy')
+    print(f"{csv_path} -> {parquet_path} ({len(df)}건)")